@@ -26,9 +26,13 @@ def train_range(loaded_checkpoint, epochs):
 
 
 def loaded_model(loaded_checkpoint, model):
-    new_model = deepcopy(model)  # need to copy model so we don't get weird results
-    if loaded_checkpoint is not None:
-        new_model.load_state_dict(loaded_checkpoint["model_state_dict"])
+    if loaded_checkpoint is None:
+        # no weights to load, still copy model so we don't get weird results
+        return deepcopy(model)
+    # construct a fresh model instead of deep copying parameters which are
+    # immediately overwritten by the checkpoint
+    new_model = model.__class__(**model.init_kwargs)
+    new_model.load_state_dict(loaded_checkpoint["model_state_dict"])
     return new_model
 
 
@@ -119,7 +119,7 @@ class Checkpoint:
 
     def load(self):
         """Return checkpoint dictionary"""
-        return torch.load(self.path)
+        return torch.load(self.path, map_location="cpu")
 
 
 class TrainingOutput:
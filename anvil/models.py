@@ -79,6 +79,10 @@ class AffineLayer(nn.Module):
     inverse_coupling_layer(z_input):
         performs the transformation of the inverse coupling layer, denoted
         g_i^{-1}(z)
+    inverse_coupling_log_det(z_input):
+        performs the inverse coupling layer transformation whilst also
+        returning the contribution to the log det jacobian of the forward
+        transformation, sharing a single evaluation of the network s
     det_jacobian(phi_input):
         returns the contribution to the determinant of the jacobian
         = \frac{\partial g(\phi)}{\partial \phi}
@@ -199,6 +203,36 @@ class AffineLayer(nn.Module):
         phi_b = (z_b - t_out) * torch.exp(-s_out)
         return self.join_func([z_a, phi_b], dim=1)
 
+    def inverse_coupling_log_det(self, z_input):
+        r"""performs the transformation of the inverse coupling layer, as
+        `inverse_coupling_layer`, whilst also returning this layer's
+        contribution to the log det jacobian of the *forward* transformation.
+
+        The forward contribution at \phi = g_i^{-1}(z) is sum_j s_i(\phi_a)_j
+        and \phi_a = z_a, so the same s_i(z_a) evaluation used to invert the
+        layer gives the contribution directly.
+
+        Parameters
+        ----------
+        z_input: torch.Tensor
+            stack of vectors z, shape (N_states, D)
+
+        Returns
+        -------
+        out: torch.Tensor
+            stack of transformed vectors phi, with same shape as input
+        log_det: torch.Tensor
+            contribution to log det jacobian of the forward transformation,
+            shape (N_states,)
+
+        """
+        z_a = z_input[:, self._a_ind]
+        z_b = z_input[:, self._b_ind]
+        s_out = self._s_forward(z_a)
+        t_out = self._t_forward(z_a)
+        phi_b = (z_b - t_out) * torch.exp(-s_out)
+        return self.join_func([z_a, phi_b], dim=1), s_out.sum(dim=-1)
+
     def forward(self, phi_input):
         """Same as `coupling_layer`, but `forward` is a special method of a
         nn.Module which should be overridden
@@ -263,6 +297,11 @@ class RealNVP(nn.Module):
     ):
         super(RealNVP, self).__init__()
         self.size_in = size_in
+        # keyword arguments required to construct an equivalent model, used
+        # when loading checkpoints to avoid deep copying this instance
+        self.init_kwargs = dict(
+            n_affine=n_affine, size_in=size_in, affine_hidden_shape=affine_hidden_shape
+        )
         # log(Normalization) for `size_in` gaussian units prob distribution func
         self._log_gauss_norm = log(sqrt(pow(2 * pi, size_in)))
         self.affine_layers = nn.ModuleList(
@@ -298,6 +337,42 @@ class RealNVP(nn.Module):
             # TODO: make this yield, then make a yield from wrapper?
         return phi_out
 
+    def inverse_map_with_log_ptilde(self, z_input: torch.Tensor):
+        r"""Map a stack of simple distribution states to phi states, as
+        `inverse_map`, also returning log(\tilde p) of the mapped states from
+        the same pass through the affine layers.
+
+        The model density factorises as
+
+            log \tilde p(\phi) = log p_z(z) + log det J(\phi), z = f(\phi)
+
+        and the jacobian contribution of each layer depends only on the half
+        of the state it leaves untransformed, which is available during the
+        inverse pass. Accumulating the contributions while inverting
+        therefore gives log(\tilde p) without the extra forward pass of
+        calling `inverse_map` followed by the model itself.
+
+        Parameters
+        ----------
+        z_input: torch.Tensor
+            stack of simple distribution state vectors, shape (N_states, D)
+
+        Returns
+        -------
+        out: torch.Tensor
+            stack of transformed states, same shape as input
+        log_ptilde: torch.Tensor
+            column of log(\tilde p) associated with each transformed state
+
+        """
+        log_jacob_contr = torch.zeros(z_input.size()[0], 1)
+        phi_out = z_input
+        for layer in reversed(self.affine_layers):  # reverse layers!
+            phi_out, log_det = layer.inverse_coupling_log_det(phi_out)
+            log_jacob_contr += log_det.view(-1, 1)
+        log_simple_prob = self.log_probability_normal(z_input)
+        return phi_out, log_simple_prob + log_jacob_contr
+
     def log_probability_normal(self, x_tensor):
         """Caculate the log probability of states, if each node was drawn from
         a normal distribution with mean 0, variance 1
@@ -13,6 +13,9 @@ import numpy as np
 from scipy.signal import correlate
 import torch
 
+# random number generator for bootstrap resampling indices
+_rng = np.random.default_rng()
+
 
 def arcosh(x):
     """Inverse hyperbolic cosine function for torch.Tensor arguments.
@@ -64,28 +67,30 @@ def calc_two_point_function(sample_training_output, training_geometry):
     # allow for additional dimensions like bootstrap
     _, _, *extra_dims = sample_training_output.shape
 
-    g_func = torch.empty(
-        (training_geometry.length, training_geometry.length, *extra_dims)
+    length = training_geometry.length
+    # all length^2 shifts in a single call, one row per shift
+    shifts = training_geometry.get_shift(
+        shifts=tuple((i, j) for i in range(length) for j in range(length)),
+        dims=((0, 1),) * length ** 2,
     )
-    for i in range(training_geometry.length):
-        for j in range(training_geometry.length):
-            shift = training_geometry.get_shift(shifts=((i, j),), dims=((0, 1),)).view(
-                -1
-            )  # make 1d
-
-            # Sample of size (target_length, n_states)
-            phi = sample_training_output
-            phi_shift = phi[:, shift]
-
-            #  Average over stack of states
-            phi_mean = phi.mean(dim=0)
-            phi_shift_mean = phi_shift.mean(dim=0)
-            phi_shift_phi_mean = (phi_shift * phi).mean(dim=0)
-
-            # Average over coordinates
-            g_func[i, j] = torch.mean(
-                phi_shift_phi_mean - phi_shift_mean * phi_mean, dim=0
-            )
+
+    # Sample of size (target_length, n_states)
+    phi = sample_training_output
+    # Average over stack of states, which doesn't depend on the shift
+    phi_mean = phi.mean(dim=0)
+
+    g_func = torch.empty((length, length, *extra_dims))
+    for k, shift in enumerate(shifts):
+        phi_shift = phi[:, shift]
+
+        #  Average over stack of states
+        phi_shift_mean = phi_shift.mean(dim=0)
+        phi_shift_phi_mean = (phi_shift * phi).mean(dim=0)
+
+        # Average over coordinates
+        g_func[k // length, k % length] = torch.mean(
+            phi_shift_phi_mean - phi_shift_mean * phi_mean, dim=0
+        )
     return g_func
 
 
@@ -114,18 +119,22 @@ def volume_avg_two_point_function(sample_training_output, training_geometry):
 
     """
 
-    va_2pf = torch.empty_like(sample_training_output).view(
-        -1, training_geometry.length, training_geometry.length
+    length = training_geometry.length
+    # all length^2 shifts in a single call, one row per shift
+    shifts = training_geometry.get_shift(
+        shifts=tuple((i, j) for i in range(length) for j in range(length)),
+        dims=((0, 1),) * length ** 2,
     )
-    for i in range(training_geometry.length):
-        for j in range(training_geometry.length):
-            shift = training_geometry.get_shift(shifts=((i, j),), dims=((0, 1),)).view(
-                -1
-            )
-
-            va_2pf[:, i, j] = (
-                sample_training_output[:, shift] * sample_training_output
-            ).mean(dim=1) - sample_training_output.mean(dim=1).pow(2)
+
+    # volume average of the field squared doesn't depend on the shift, so
+    # compute it once rather than per (i, j)
+    vol_mean_sq = sample_training_output.mean(dim=1).pow(2)
+
+    va_2pf = torch.empty_like(sample_training_output).view(-1, length, length)
+    for k, shift in enumerate(shifts):
+        va_2pf[:, k // length, k % length] = (
+            sample_training_output[:, shift] * sample_training_output
+        ).mean(dim=1) - vol_mean_sq
     return va_2pf
 
 
@@ -154,8 +163,10 @@ def bootstrap_function(func, states, *args, n_boot=100):
         dimension
 
     """
-    boot_index = torch.randint(0, states.shape[0], size=(states.shape[0], n_boot))
-    # put boot index on final dimension
+    n_states = states.shape[0]
+    # draw every resample index in a single vectorized block
+    boot_index = torch.from_numpy(_rng.integers(0, n_states, size=(n_states, n_boot)))
+    # single gather of all resamples, with boot index put on final dimension
     resampled_states = states[boot_index, :].transpose(1, 2)
     res = func(resampled_states, *args)
     return res
@@ -312,10 +323,12 @@ def autocorr_two_point(volume_avg_two_point_function, window=2.0):
     """
     # TODO: look at more than one seperation
     x = t = 0
-    va_2pf = volume_avg_two_point_function[:, x, t]
-    va_2pf -= va_2pf.mean()
-    # converts to numpy array
-    autocorrelation = correlate(va_2pf, va_2pf, mode="same")
+    va_2pf = volume_avg_two_point_function[:, x, t].numpy()
+    # subtract mean without mutating the input tensor, which .numpy() shares
+    # memory with
+    va_2pf = va_2pf - va_2pf.mean()
+    # fft-based correlation is O(N log N) in the chain length
+    autocorrelation = correlate(va_2pf, va_2pf, mode="same", method="fft")
     c = np.argmax(autocorrelation)
     autocorrelation = autocorrelation[c:] / autocorrelation[c]
     return autocorrelation
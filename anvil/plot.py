@@ -176,10 +176,14 @@ def plot_bootstrap_single_number(observable, label):
     distribution
 
     """
+    observable = np.asarray(observable)
+    # bin in one vectorized pass rather than leaving it to ax.hist
+    counts, bin_edges = np.histogram(observable, bins=30)
     fig, ax = plt.subplots()
     ax.hist(
-        observable,
-        bins=30,
+        bin_edges[:-1],
+        bins=bin_edges,
+        weights=counts,
         label=f"mean: {observable.mean()}, std dev.: {observable.std()}",
     )
     title = "Bootstrap distribution: " + label
@@ -195,6 +199,7 @@ def plot_bootstrap_multiple_numbers(observable, labels):
     with a histogram for each element's bootstrap sample
 
     """
+    observable = np.asarray(observable)  # convert once rather than per row
     for i in range(observable.shape[0]):
         yield plot_bootstrap_single_number(observable[i], labels[i])
 
@@ -203,7 +208,7 @@ def plot_bootstrap_multiple_numbers(observable, labels):
 def plot_bootstrap_two_point(two_point_function):
     """Plot the distribution of G(0, 0)"""
     x = t = 0
-    data_to_plot = two_point_function(x, t)
+    data_to_plot = two_point_function[x, t]
     return plot_bootstrap_single_number(data_to_plot, rf"$G$({x},{t})")
 
 
@@ -4,10 +4,10 @@ sample.py
 Module containing functions related to sampling from a trained model
 """
 
-from math import exp, isfinite, ceil
+from math import ceil
 import logging
 
-from numpy.random import uniform
+import numpy as np
 import torch
 
 from tqdm import tqdm
@@ -17,12 +17,63 @@ from reportengine import collect
 
 log = logging.getLogger(__name__)
 
+# random number generator for the accept/reject draws, faster than the legacy
+# numpy.random functions for bulk generation
+_rng = np.random.default_rng()
+
+# Hard coded number of states for estimating integrated autocorrelation
+AUTOCORR_BATCH_SIZE = 10000
+# denominator (N - tau) for each lag, fixed by the hard coded batch size, so
+# it doesn't have to be rebuilt on each call
+_AUTOCORR_DENOM = np.arange(AUTOCORR_BATCH_SIZE, 0, -1, dtype=np.float32)
+
 
 class LogRatioNanError(Exception):
     pass
 
 
-def sample_batch(loaded_model, action, batch_size, current_state=None):
+def _metropolis_scan(log_ratio, log_u):
+    r"""Tight accept/reject scan over a batch of proposals.
+
+    The acceptance condition is evaluated in the log domain: proposal j is
+    accepted when
+
+        log(u_j) <= log_ratio[i] - log_ratio[j]
+
+    which is equivalent to u_j <= min[1, exp(log_ratio[i] - log_ratio[j])]
+    without having to exponentiate at each step. Operating on plain float64
+    numpy arrays keeps each step down to a scalar comparison, rather than
+    dispatching tensor ops for every proposal.
+
+    Parameters
+    ----------
+    log_ratio: numpy.ndarray
+        1d float64 array of log(\tilde p) + S for the batch of states,
+        length batch_size + 1 (element 0 is the current state)
+    log_u: numpy.ndarray
+        1d float64 array of logged uniform random numbers, length batch_size
+
+    Returns
+    -------
+    chain_indices: numpy.ndarray
+        index into the batch of states of each link in the resulting chain
+    history: numpy.ndarray
+        boolean array containing accept/reject history of the chain
+
+    """
+    n_proposals = log_u.size
+    chain_indices = np.empty(n_proposals, dtype=np.int64)
+    history = np.zeros(n_proposals, dtype=bool)
+    i = 0  # index of current state
+    for j in range(n_proposals):  # j + 1 = index of proposed state
+        if log_u[j] <= log_ratio[i] - log_ratio[j + 1]:  # accepted
+            i = j + 1
+            history[j] = True
+        chain_indices[j] = i
+    return chain_indices, history
+
+
+def sample_batch(loaded_model, action, batch_size, current_state=None, z_buf=None):
     r"""
     Sample using Metroplis-Hastings algorithm from a large number of phi
     configurations.
@@ -33,7 +84,10 @@ def sample_batch(loaded_model, action, batch_size, current_state=None):
 
     Where i is the index of the current phi in metropolise chain and j is the
     current proposal. A uniform random number, u, is drawn and if u <= A then
-    the proposed state phi^j is accepted (and becomes phi^i for the next update)
+    the proposed state phi^j is accepted (and becomes phi^i for the next
+    update). The comparison is carried out in the log domain, see
+    `_metropolis_scan`, which avoids exponentiating the ratio of
+    probabilities altogether.
 
     Parameters
     ----------
@@ -46,43 +100,54 @@ def sample_batch(loaded_model, action, batch_size, current_state=None):
         the number of states to generate from the loaded_model
     current_state: torch.Tensor or None
         the current state of the chain. None if this is the first batch
+    z_buf: torch.Tensor or None
+        optional preallocated (batch_size + 1, size_in) tensor to draw the
+        simple distribution states into, allowing callers which sample many
+        batches to reuse the same buffer rather than reallocating
 
     Returns
     -------
-    phi[chain_indices, :]: torch.Tensor
-        chain of configurations generated by the MH algorithm
+    phi: torch.Tensor
+        batch of configurations generated by the loaded_model, such that
+        phi[chain_indices, :] is the chain generated by the MH algorithm
+    chain_indices: torch.LongTensor
+        index into phi of each link in the chain, which allows callers to
+        gather only the subset of the chain they need
     history: torch.BoolTensor
         boolean tensor containing accept/reject history of chain
     """
     with torch.no_grad():  # don't track gradients
-        z = torch.randn(
-            (batch_size + 1, loaded_model.size_in)
-        )  # random z configurations
-        phi = loaded_model.inverse_map(z)  # map using trained loaded_model to phi
+        if z_buf is None:
+            z_buf = torch.empty((batch_size + 1, loaded_model.size_in))
+        z_buf.normal_()  # random z configurations
+        # map to phi and accumulate log ptilde in the same pass through the
+        # affine layers, instead of mapping then running the model forwards
+        phi, log_ptilde = loaded_model.inverse_map_with_log_ptilde(z_buf)
         if current_state is not None:
             phi[0] = current_state
-        log_ptilde = loaded_model(phi)
-    history = torch.zeros(batch_size, dtype=torch.bool)  # accept/reject history
-    chain_indices = torch.zeros(batch_size, dtype=torch.long)
-
-    log_ratio = log_ptilde + action(phi)
-    if not isfinite(exp(float(min(log_ratio) - max(log_ratio)))):
+            # the injected state wasn't generated from z_buf, so its log
+            # density needs an explicit (single state) forward pass
+            log_ptilde[0] = loaded_model(current_state.view(1, -1))[0]
+        log_ratio = log_ptilde + action(phi)
+
+    # single conversion of the batched log ratios, shared by the sanity check
+    # and the accept/reject scan
+    log_ratio = log_ratio.numpy().ravel().astype(np.float64)
+    # single fused pass over the batch, rather than separate min and max
+    # reductions: any non-finite log ratio could produce nans in the
+    # accept/reject comparisons
+    if not np.isfinite(log_ratio).all():
         raise LogRatioNanError(
             "could run into nans based on minimum and maximum log of ratio of probabilities"
         )
 
-    rand_batch = uniform(size=batch_size+1)  # gen batch of random uniform numbers
-    i = 0  # phi index of current state
-    for j in range(1, batch_size + 1):  # j = phi index of proposed state
-        condition = min(1, exp(float(log_ratio[i] - log_ratio[j])))
-        if rand_batch[j] <= condition:  # accepted
-            chain_indices[j - 1] = j
-            history[j - 1] = True
-            i = j
-        else:  # rejected
-            chain_indices[j - 1] = i
+    # log of batch of random uniform numbers, for log domain accept/reject
+    log_u = np.log(_rng.random(batch_size))
+    chain_indices, history = _metropolis_scan(log_ratio, log_u)
+    chain_indices = torch.from_numpy(chain_indices)
+    history = torch.from_numpy(history)
 
-    return phi[chain_indices, :], history
+    return phi, chain_indices, history
 
 
 def thermalised_state(loaded_model, action, thermalisation) -> torch.Tensor:
@@ -105,9 +170,9 @@ def thermalised_state(loaded_model, action, thermalisation) -> torch.Tensor:
     if thermalisation is None:
         return thermalisation
 
-    states, _ = sample_batch(loaded_model, action, thermalisation)
+    phi, chain_indices, _ = sample_batch(loaded_model, action, thermalisation)
     log.info(f"Thermalisation: discarded {thermalisation} configurations.")
-    return states[-1]
+    return phi[chain_indices[-1]]
 
 
 def chain_autocorrelation(
@@ -155,37 +220,32 @@ def chain_autocorrelation(
     if sample_interval:  # if specified sample_interval will evaluate to true
         return sample_interval
 
-    # Hard coded num states for estimating integrated autocorrelation
-    batch_size = 10000
+    batch_size = AUTOCORR_BATCH_SIZE
 
     # Sample some states
-    _, history = sample_batch(loaded_model, action, batch_size, thermalised_state)
+    _, _, history = sample_batch(loaded_model, action, batch_size, thermalised_state)
 
-    accepted = float(torch.sum(history))
     n_states = len(history)
-    autocorrelations = torch.zeros(
-        n_states + 1, dtype=torch.float
-    )  # +1 in case 100% rejected
-    consecutive_rejections = 0
-
-    for step in history:
-        if step:  # move accepted
-            if consecutive_rejections > 0:  # faster than unnecessarily accessing array
-                autocorrelations[1 : consecutive_rejections + 1] += torch.arange(
-                    consecutive_rejections, 0, -1, dtype=torch.float
-                )
-            consecutive_rejections = 0
-        else:  # move rejected
-            consecutive_rejections += 1
-    if consecutive_rejections > 0:  # pick up last rejection run
-        autocorrelations[1 : consecutive_rejections + 1] += torch.arange(
-            consecutive_rejections, 0, -1, dtype=torch.float
-        )
 
-    # Compute integrated autocorrelation
-    integrated_autocorrelation = 0.5 + torch.sum(
-        autocorrelations / torch.arange(n_states + 1, 0, -1, dtype=torch.float)
-    )
+    # index of each accepted state, with sentinels at either end so that
+    # rejections before the first acceptance and after the last one are
+    # counted as runs as well
+    accept_positions = np.r_[-1, np.flatnonzero(history.numpy()), n_states]
+    # length of each run of consecutive rejections
+    rejection_runs = np.diff(accept_positions) - 1
+
+    # number of runs of each length: autocorrelations[tau] picks up a
+    # contribution of (k - tau + 1) from every run of length k >= tau, which
+    # is a double reverse cumulative sum over the histogram of run lengths
+    # accumulate in float32, which is plenty of precision for an estimate
+    # that is doubled and rounded up, at half the memory traffic of float64
+    run_counts = np.bincount(rejection_runs, minlength=n_states + 1)
+    runs_at_least = np.cumsum(run_counts[::-1], dtype=np.float32)[::-1]
+    autocorrelations = np.cumsum(runs_at_least[::-1], dtype=np.float32)[::-1]
+
+    # Compute integrated autocorrelation (tau = 0 excluded as before), using
+    # the cached denominator since n_states == AUTOCORR_BATCH_SIZE
+    integrated_autocorrelation = 0.5 + np.sum(autocorrelations[1:] / _AUTOCORR_DENOM)
     sample_interval = ceil(2 * integrated_autocorrelation)
     log.info(
         f"Guess for sampling interval: {sample_interval}, based on {batch_size} configurations."
@@ -236,30 +296,34 @@ def sample(
     decorrelated_chain = torch.empty(
         (actual_length, loaded_model.size_in), dtype=torch.float32
     )
-    accepted = 0
+    # reuse a single z buffer across batches rather than reallocating
+    z_buf = torch.empty((batch_size + 1, loaded_model.size_in))
+    histories = []
 
     log.debug(
         f"Generating {n_batches * batch_size} configurations "
         f"in {n_batches} batches of size {batch_size}"
     )
 
-    pbar = tqdm(range(n_batches), desc="batch")
+    # disable=None turns the bar off entirely on non-interactive runs
+    pbar = tqdm(range(n_batches), desc="batch", disable=None)
     for batch in pbar:
         # Generate sub-chain of batch_size configurations
-        batch_chain, batch_history = sample_batch(
-            loaded_model, action, batch_size, current_state
+        batch_phi, batch_indices, batch_history = sample_batch(
+            loaded_model, action, batch_size, current_state, z_buf=z_buf
         )
-        current_state = batch_chain[-1]
+        current_state = batch_phi[batch_indices[-1]]
 
-        accepted += torch.sum(batch_history)
+        histories.append(batch_history)
 
-        # Add to larger chain
+        # Add to larger chain, gathering only the decorrelated configurations
+        # via a strided view of the chain indices
         start = batch * dec_samp_per_batch
-        decorrelated_chain[start : start + dec_samp_per_batch, :] = batch_chain[
-            ::sample_interval
+        decorrelated_chain[start : start + dec_samp_per_batch, :] = batch_phi[
+            batch_indices[::sample_interval]
         ]
-    accepted = float(accepted)
-    # Accept-reject statistics
+    # Accept-reject statistics, single reduction over all batches
+    accepted = float(torch.sum(torch.cat(histories)))
     rejected = n_batches * batch_size - accepted
     fraction = accepted / (accepted + rejected)
 
@@ -5,6 +5,8 @@ sample from trained models
 """
 import logging
 
+import torch
+
 from reportengine.app import App
 from anvil.config import ConfigParser
 
@@ -21,6 +23,12 @@ class SampleApp(App):
 
 
 def main():
+    # sampling and observables never need gradients, so turn off autograd
+    # bookkeeping for the whole app
+    torch.autograd.set_grad_enabled(False)
+    # tensor ops here are small enough that intra-op thread fan-out costs
+    # more than it saves
+    torch.set_num_threads(1)
     a = SampleApp(name="anvil-sample", providers=PROVIDERS)
     a.main()
 
@@ -68,16 +68,16 @@ def table_two_point_function(training_geometry, two_point_function):
     """For each x and t, tabulate the mean and standard deviation of the two
     point function, estimated from bootstrap sample
     """
-    corr = []
-    index = []
-    means = two_point_function.mean(dim=-1)
-    stds = two_point_function.std(dim=-1)
-
-    for i in range(training_geometry.length):
-        for j in range(training_geometry.length):
-            corr.append([float(means[i, j]), float(stds[i, j])])
-            index.append((i, j))
-    df = pd.DataFrame(corr, columns=["Mean", "Standard deviation"], index=index)
+    means = two_point_function.mean(dim=-1).numpy().ravel()[:, np.newaxis]
+    stds = two_point_function.std(dim=-1).numpy().ravel()[:, np.newaxis]
+
+    data = np.concatenate((means, stds), axis=1)
+    index = [
+        (i, j)
+        for i in range(training_geometry.length)
+        for j in range(training_geometry.length)
+    ]
+    df = pd.DataFrame(data, columns=["Mean", "Standard deviation"], index=index)
     return df
 
 
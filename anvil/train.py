@@ -47,7 +47,8 @@ def train(
     # create your optimizer and a scheduler
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(loaded_optimizer, patience=500)
     # let's use tqdm to see progress
-    pbar = tqdm(range(*train_range), desc=f"loss: {current_loss}")
+    # disable=None turns the bar off entirely on non-interactive runs
+    pbar = tqdm(range(*train_range), desc=f"loss: {current_loss}", disable=None)
     n_units = loaded_model.size_in
     for i in pbar:
         if (i % save_interval) == 0:
@@ -74,7 +75,9 @@ def train(
         scheduler.step(current_loss)
 
         if (i % 50) == 0:
-            pbar.set_description(f"loss: {current_loss.item()}")
+            # don't force an extra redraw, the next scheduled refresh will
+            # pick the description up
+            pbar.set_description(f"loss: {current_loss.item()}", refresh=False)
     torch.save(
         {
             "epoch": train_range[-1],